@@ -15,28 +15,54 @@ from colossalai.context import ParallelMode
 from colossalai.logging import get_dist_logger
 from colossalai.utils import (copy_tensor_parallel_attributes, clip_grad_norm_fp32, multi_tensor_applier)
 from torch.distributed import ProcessGroup
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
 from .grad_scaler import BaseGradScaler
-from ._utils import has_inf_or_nan, zero_gard_by_list
+from ._utils import is_bf16_supported, zero_gard_by_list
 
 __all__ = ['FP16Optimizer']
 
 
-def _multi_tensor_copy_this_to_that(this, that, overflow_buf=None):
+def _flatten_params_into_buffer(params):
     """
-    adapted from Megatron-LM (https://github.com/NVIDIA/Megatron-LM)
-
-    Use multi-tensor-applier to copy values from one list to another.
-    We don't have a blfoat16 implementation so for now if the overflow_buf
-    is not provided, we default back to simple loop copy to be compatible
-    with bfloat16.
+    Move the data of params into a single contiguous buffer,
+    after which the data of each param is a view of this buffer.
+    Note that the original data and the buffer coexist until the copy is done,
+    so the peak memory of the params is doubled transiently during construction.
+    """
+    if not params:
+        return None
+    param_data = [param.data for param in params]
+    flat_buffer = _flatten_dense_tensors(param_data)
+    for param, data in zip(params, _unflatten_dense_tensors(flat_buffer, param_data)):
+        param.data = data
+    return flat_buffer
+
+
+def _cast_state_value(value, param, key=None):
+    if torch.is_tensor(value):
+        # the step counter is kept as it is like torch does, casting it to a low precision dtype
+        # breaks bias correction and moving it off the host adds a sync to every step
+        if key == 'step':
+            return value
+        if param.is_floating_point():
+            value = value.to(param.dtype)
+        return value.to(param.device)
+    elif isinstance(value, dict):
+        return {k: _cast_state_value(v, param, key=k) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_cast_state_value(v, param) for v in value)
+    return value
+
+
+def _cast_param_state(state, param):
     """
-    if overflow_buf:
-        overflow_buf.fill_(0)
-        # Scaling with factor `1.0` is equivalent to copy.
-        multi_tensor_applier(colossal_C.multi_tensor_scale, overflow_buf, [this, that], 1.0)
-    else:
-        for this_, that_ in zip(this, that):
-            that_.copy_(this_)
+    Cast the per-param state tensors to the dtype and device of the param in place,
+    following the rules of `torch.optim.Optimizer.load_state_dict`, but without
+    deep-copying the whole optimizer state.
+    """
+    for key, value in state.items():
+        state[key] = _cast_state_value(value, param, key=key)
+    return state
 
 
 class DynamicGradScaler:
@@ -90,7 +116,7 @@ class DynamicGradScaler:
 
     @property
     def inv_scale(self):
-        return self._scale.double().reciprocal().float()
+        return self._scale.reciprocal()
 
     def update(self, found_inf):
 
@@ -160,6 +186,9 @@ class FP16Optimizer(Optimizer):
     :type max_scale: int
     :param verbose: if set to `True`, will print debug info
     :type verbose: bool
+    :param master_dtype: data type of the master copy of fp16 params, can be `torch.float32` or `torch.bfloat16`.
+        bf16 master params halve the memory of the master copy but do not support gradient clipping
+    :type master_dtype: torch.dtype
     """
 
     def __init__(self,
@@ -168,7 +197,8 @@ class FP16Optimizer(Optimizer):
                  verbose: bool = False,
                  clip_grad_norm=0,
                  dp_process_group: ProcessGroup = None,
-                 mp_process_group: ProcessGroup = None):
+                 mp_process_group: ProcessGroup = None,
+                 master_dtype: torch.dtype = torch.float32):
         # have a defaults for compatibility with pytorch optim
         self._optimizer = optimizer
         self._defaults = optimizer.defaults
@@ -176,16 +206,27 @@ class FP16Optimizer(Optimizer):
         # fp16-related params
         assert isinstance(grad_scaler, BaseGradScaler)
         self._grad_scaler = grad_scaler
-        self._found_overflow = torch.cuda.FloatTensor([0.0])
-        self._dummy_overflow_buf = torch.cuda.IntTensor([0])
+        self._found_overflow = torch.cuda.IntTensor([0])
+        # host copy of the inverse loss scale which is passed to the unscale kernels,
+        # it is refreshed after the overflow flag is read so it never blocks on its own
+        self._inv_scale_value = self._grad_scaler.inv_scale.item()
 
         # misc params
         self._clip_grad_max_norm = clip_grad_norm
 
+        # master params
+        assert master_dtype in (torch.float32, torch.bfloat16), \
+            f'Expected master_dtype to be torch.float32 or torch.bfloat16, but got {master_dtype}'
+        assert master_dtype == torch.float32 or clip_grad_norm == 0, \
+            'Gradient clipping is only supported with fp32 master params'
+        if master_dtype == torch.bfloat16 and not is_bf16_supported():
+            raise RuntimeError('bf16 master params need a GPU with native bfloat16 support (Ampere or newer)')
+        self._master_dtype = master_dtype
+
         # get process group
         def _get_process_group(parallel_mode):
-            if gpc.is_initialized(ParallelMode.DATA) and gpc.get_world_size(ParallelMode.DATA):
-                return gpc.get_group(ParallelMode.DATA)
+            if gpc.is_initialized(parallel_mode) and gpc.get_world_size(parallel_mode) > 1:
+                return gpc.get_group(parallel_mode)
             else:
                 return None
 
@@ -197,46 +238,68 @@ class FP16Optimizer(Optimizer):
         self._dp_process_group = dp_process_group
         self._mp_process_group = mp_process_group
 
+        # the overflow flag is reduced over both dp and mp groups, the default DATA and MODEL groups
+        # of the global context tile the world, so a single all-reduce over the world is enough for them,
+        # user-supplied groups are reduced one by one as their sizes do not tell whether they tile the world
+        def _is_default_group(group, parallel_mode):
+            return gpc.is_initialized(parallel_mode) and group is gpc.get_group(parallel_mode)
+
+        self._overflow_process_groups = [group for group in (dp_process_group, mp_process_group) if group]
+        if len(self._overflow_process_groups) == 2 and _is_default_group(dp_process_group, ParallelMode.DATA) \
+                and _is_default_group(mp_process_group, ParallelMode.MODEL):
+            dp_size = dist.get_world_size(dp_process_group)
+            mp_size = dist.get_world_size(mp_process_group)
+            if dp_size * mp_size == dist.get_world_size():
+                self._overflow_process_groups = [dist.group.WORLD]
+
         # we maintain three groups of parameters
         # so that the model can have a mixture
         # of fp16 and fp32 params
         # fp16_param_groups: the fp16 params of the model
-        # fp32_master_param_groups: the fp32 params cast from the fp16 param of the model
+        # fp32_master_param_groups: the fp32 params cast from the fp16 param of the model,
+        #   which are in bf16 instead if master_dtype is torch.bfloat16
         # fp32_param_groups: the fp32 params of the model
         # NOTE:
         # 1. fp16_param_groups and fp32_master_param_groups have one-to-one correspondence
         # 2. fp32_param_groups and fp16_param_groups are exclusive of each other
+        # 3. fp32_master_grad_groups holds the preallocated fp32 gradient buffers
+        #    of fp32_master_param_groups, which are reused across iterations
         self._fp16_param_groups = []
         self._fp32_master_param_groups = []
+        self._fp32_master_grad_groups = []
         self._fp32_param_groups = []
 
         # For all the groups in the original optimizer:
         for param_group in self._optimizer.param_groups:
             fp16_params = []
             fp32_master_params = []
+            fp32_master_grads = []
             fp32_params = []
             # For all the parameters in this group:
             for i, param in enumerate(param_group['params']):
                 if param.requires_grad:
                     # float16 params:
-                    if param.type() in ['torch.cuda.HalfTensor']:
+                    if param.dtype is torch.float16 and param.is_cuda:
                         fp16_params.append(param)
 
                         # Create a fp32 copy
-                        fp32_param = param.detach().clone().float()
+                        fp32_param = param.detach().clone().to(self._master_dtype)
                         # Copy tensor model parallel attributes.
                         copy_tensor_parallel_attributes(param, fp32_param)
 
                         # Replace the optimizer params with the new fp32 copy.
                         param_group['params'][i] = fp32_param
                         fp32_master_params.append(fp32_param)
+                        fp32_master_grads.append(torch.empty_like(fp32_param))
 
-                        # Reset existing state dict key to the new main param.
+                        # Reset existing state dict key to the new main param
+                        # and recast its per-param state tensors in place.
                         if param in self._optimizer.state:
-                            self._optimizer.state[fp32_param] = self._optimizer.state.pop(param)
+                            self._optimizer.state[fp32_param] = _cast_param_state(self._optimizer.state.pop(param),
+                                                                                  fp32_param)
 
                     # fp32 params.
-                    elif param.type() == 'torch.cuda.FloatTensor':
+                    elif param.dtype is torch.float32 and param.is_cuda:
                         fp32_params.append(param)
                     else:
                         raise TypeError('Expected parameter of type torch.cuda.FloatTensor '
@@ -244,11 +307,16 @@ class FP16Optimizer(Optimizer):
 
             self._fp16_param_groups.append(fp16_params)
             self._fp32_master_param_groups.append(fp32_master_params)
+            self._fp32_master_grad_groups.append(fp32_master_grads)
             self._fp32_param_groups.append(fp32_params)
 
-        # Leverage state_dict() and load_state_dict() to
-        # recast preexisting per-param state tensors
-        self._optimizer.load_state_dict(self._optimizer.state_dict())
+        # the parameter set is static after construction, so the fp16 params and their
+        # master params are backed by contiguous buffers, which makes copying the master
+        # params back to fp16 params a single kernel
+        self._flat_fp16_params = _flatten_params_into_buffer([p for group in self._fp16_param_groups for p in group])
+        self._flat_fp32_master_params = _flatten_params_into_buffer(
+            [p for group in self._fp32_master_param_groups for p in group])
+        self._flat_params = [p for group in self._optimizer.param_groups for p in group['params']]
 
         # log config
         self._logger = get_dist_logger()
@@ -257,6 +325,7 @@ class FP16Optimizer(Optimizer):
                 f"\n=========  FP16 Optimizer Config =========\n"
                 f"Optimizer: {optimizer.__class__.__name__}\n"
                 f"clip_grad_norm = {clip_grad_norm}\n"
+                f"master_dtype = {master_dtype}\n"
                 f"grad_scaler = {self._grad_scaler.__class__.__name__}"
                 f"==========================================",
                 ranks=[0])
@@ -277,67 +346,72 @@ class FP16Optimizer(Optimizer):
     def defaults(self):
         return self._defaults
 
-    def _check_overflow(self):
+    def _unscale_and_check_overflow(self):
         # clear previous overflow record
-        self._found_overflow.fill_(0.0)
-
-        # check for overflow
-        for group in self._optimizer.param_groups:
-            for p in group['params']:
-                if has_inf_or_nan(p.grad):
-                    self._found_overflow.fill_(1.0)
-                    break
+        self._found_overflow.fill_(0)
+        inv_scale = self._inv_scale_value
+
+        # collect the fp16 grads and hand over
+        # the preallocated master grads to master params
+        fp16_grads = []
+        fp32_master_grads = []
+        for fp16_group, fp32_master_group, fp32_master_grad_group in zip(self._fp16_param_groups,
+                                                                         self._fp32_master_param_groups,
+                                                                         self._fp32_master_grad_groups):
+            for fp16_param, fp32_param, fp32_grad in zip(fp16_group, fp32_master_group, fp32_master_grad_group):
+                if fp16_param.grad is not None:
+                    fp16_grads.append(fp16_param.grad.data)
+                    fp32_master_grads.append(fp32_grad)
+                    fp32_param.grad = fp32_grad
+                    # clear unneeded grad on fp16 param
+                    fp16_param.grad = None
+                else:
+                    # the master param keeps no grad from a previous step if its fp16 param got none
+                    fp32_param.grad = None
+        if fp16_grads:
+            if self._master_dtype == torch.float32:
+                # cast the fp16 grads into fp32 master grads,
+                # unscale them and check for overflow in a single kernel launch
+                multi_tensor_applier(colossal_C.multi_tensor_scale, self._found_overflow,
+                                     [fp16_grads, fp32_master_grads], inv_scale)
+            else:
+                # we don't have a bfloat16 implementation of the scale kernel, so only
+                # the overflow check is fused and the cast falls back to a simple loop
+                multi_tensor_applier(colossal_C.multi_tensor_l2norm, self._found_overflow, [fp16_grads], False)
+                for fp16_grad, master_grad in zip(fp16_grads, fp32_master_grads):
+                    master_grad.copy_(fp16_grad).mul_(inv_scale)
 
-        # all-reduce across dp group
-        if self._dp_process_group:
-            dist.all_reduce(self._found_overflow, op=dist.ReduceOp.MAX, group=self._dp_process_group)
+        # unscale the grads of fp32 params in place
+        fp32_grads = [p.grad.data for group in self._fp32_param_groups for p in group if p.grad is not None]
+        if fp32_grads:
+            multi_tensor_applier(colossal_C.multi_tensor_scale, self._found_overflow, [fp32_grads, fp32_grads],
+                                 inv_scale)
 
-        # all-reduce over model parallel group
-        if self._mp_process_group:
-            dist.all_reduce(self._found_overflow, op=dist.ReduceOp.MAX, group=self._mp_process_group)
+        # all-reduce across dp and model parallel groups
+        for group in self._overflow_process_groups:
+            dist.all_reduce(self._found_overflow, op=dist.ReduceOp.MAX, group=group)
 
-        return self._found_overflow.item() > 0
+        return self._found_overflow
 
     def zero_grad(self, set_to_none=True):
         # set_to_none = True can save some memory space
-        for param_group in self._optimizer.param_groups:
-            zero_gard_by_list(param_group['params'], set_to_none=set_to_none)
-
-    def _get_fp32_param_groups_to_update(self):
-        return self._fp32_master_param_groups + self._fp32_param_groups
-
-    def _unscale_grads(self):
-        for group in self._get_fp32_param_groups_to_update():
-            for p in group:
-                if p.grad is not None:
-                    p.grad.data.div_(self.loss_scale)
-
-    def _assign_grad_to_fp32_master_param(self):
-        # This only needs to be done for the float16 group.
-        for fp16_param_group, fp32_master_param_group in zip(self._fp16_param_groups, self._fp32_master_param_groups):
-            for fp16_param, fp32_param in zip(fp16_param_group, fp32_master_param_group):
-                fp32_param.grad = fp16_param.grad.float()
-                # clear unneeded grad on fp16 param
-                fp16_param.grad = None
+        zero_gard_by_list(self._flat_params, set_to_none=set_to_none)
 
     def _update_fp16_param_from_fp32_param(self):
-        fp16_param_data = []
-        fp32_master_param_data = []
-        for fp16_group, fp32_group in zip(self._fp16_param_groups, self._fp32_master_param_groups):
-            for fp16_param, fp32_param in zip(fp16_group, fp32_group):
-                fp16_param_data.append(fp16_param.data)
-                fp32_master_param_data.append(fp32_param.data)
-        _multi_tensor_copy_this_to_that(this=fp32_master_param_data,
-                                        that=fp16_param_data,
-                                        overflow_buf=self._dummy_overflow_buf)
+        if self._flat_fp16_params is not None:
+            self._flat_fp16_params.copy_(self._flat_fp32_master_params)
 
     def step(self):
-        # Copy gradients from model params to main params.
-        self._assign_grad_to_fp32_master_param()
-        self._unscale_grads()
+        # Copy gradients from model params to main params,
+        # unscale them and check for overflow.
+        found_overflow = self._unscale_and_check_overflow()
 
-        overflow = self._check_overflow()
-        self._grad_scaler.update(overflow)
+        # the grad scaler consumes the overflow flag on the GPU, so the only host
+        # synchronization that waits for the backward pass is deciding whether this step should be skipped
+        self._grad_scaler.update(found_overflow)
+        overflow = found_overflow.item() > 0
+        # the stream has drained up to the scaler update, reading the new scale does not wait for other work
+        self._inv_scale_value = self._grad_scaler.inv_scale.item()
 
         if overflow:
             self.zero_grad()
@@ -358,8 +432,12 @@ class FP16Optimizer(Optimizer):
         return True, grad_norm
 
     def backward(self, loss):
-        scaled_loss = loss * self.grad_scaler.scale
-        scaled_loss.backward()
+        # seed the backward pass with the loss scale, which is equivalent to
+        # calling backward on loss * scale without materializing the scaled loss,
+        # the seed is a copy as the grad scaler updates its scale in place, which a retained graph
+        # or a backward still queued on another stream would otherwise read
+        scale = self.grad_scaler.scale.detach().to(loss.dtype, copy=True).view(())
+        loss.backward(gradient=scale.expand_as(loss))
 
     def state_dict(self):
         state_dict = {}
@@ -376,20 +454,17 @@ class FP16Optimizer(Optimizer):
         # Grad scaler.
         if 'grad_scaler' in state_dict:
             self.grad_scaler.load_state_dict(state_dict['grad_scaler'])
+            self._inv_scale_value = self.grad_scaler.inv_scale.item()
 
         # Copy data for the main params.
-        if 'fp32_master_param_groups' in state_dict:
-            for current_group, ckpt_group in zip(self._fp32_master_param_groups,
-                                                 state_dict['fp32_master_param_groups']):
-                for current_param, ckpt_param in zip(current_group, ckpt_group):
-                    current_param.data.copy_(ckpt_param.data)
+        # The master params are backed by a flat buffer, so the checkpointed params are
+        # flattened as well and copied with a single (possibly host-to-device) transfer.
+        if 'fp32_master_param_groups' in state_dict and self._flat_fp32_master_params is not None:
+            ckpt_params = [p.data for group in state_dict['fp32_master_param_groups'] for p in group]
+            self._flat_fp32_master_params.copy_(_flatten_dense_tensors(ckpt_params))
 
     def clip_grad_norm(self, clip_grad):
-        params = []
-        for param_group in self._optimizer.param_groups:
-            for param in param_group['params']:
-                params.append(param)
-        return clip_grad_norm_fp32(params, clip_grad)
+        return clip_grad_norm_fp32(self._flat_params, clip_grad)
 
     # Promote state so it can be retrieved or set via
     # "optimizer_instance.state"
@@ -1,3 +1,4 @@
+import torch
 from typing import List
 from torch import Tensor
 
@@ -23,11 +24,21 @@ def has_inf_or_nan(tensor):
         return False
 
 
+def is_bf16_supported() -> bool:
+    """
+    Check if the current device computes in bfloat16 natively, which needs Ampere or newer GPUs.
+    `torch.cuda.is_bf16_supported` is not used as it is missing in older torch versions
+    and counts emulated support in newer ones.
+    """
+    return torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8
+
+
 def zero_gard_by_list(tensor_list: List[Tensor], set_to_none: bool = True) -> None:
     """
     Clear the gradient of a list of tensors,
-    Note: copied from torch.optim.optimizer.
+    Note: modified from torch.optim.optimizer.
     """
+    grads = []
     for param in tensor_list:
         if param.grad is not None:
             if set_to_none:
@@ -37,4 +48,7 @@ def zero_gard_by_list(tensor_list: List[Tensor], set_to_none: bool = True) -> No
                     param.grad.detach_()
                 else:
                     param.grad.requires_grad_(False)
-                param.grad.zero_()
+                grads.append(param.grad)
+    # zero all the grads with a single multi-tensor op rather than one kernel per grad
+    if grads:
+        torch._foreach_zero_(grads)
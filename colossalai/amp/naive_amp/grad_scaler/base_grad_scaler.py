@@ -5,7 +5,7 @@ import torch
 from abc import ABC, abstractmethod
 from colossalai.logging import get_dist_logger
 from torch import Tensor
-from typing import Dict
+from typing import Dict, Union
 
 __all__ = ['BaseGradScaler']
 
@@ -15,6 +15,8 @@ class BaseGradScaler(ABC):
     def __init__(self, initial_scale: int, verbose: bool):
         assert initial_scale > 0
         self._scale = torch.cuda.FloatTensor([initial_scale])
+        # cache of the inverse scale, which should be reset or updated in place whenever _scale is changed
+        self._inv_scale = None
         self._verbose = verbose
 
         if self._verbose:
@@ -26,17 +28,22 @@ class BaseGradScaler(ABC):
 
     @property
     def inv_scale(self) -> Tensor:
-        return self._scale.double().reciprocal().float()
+        if self._inv_scale is None:
+            self._inv_scale = self._scale.reciprocal()
+        return self._inv_scale
 
     def state_dict(self) -> Dict:
+        # the scale is updated in place during training, so a copy is saved
         state_dict = dict()
-        state_dict['scale'] = self.scale
+        state_dict['scale'] = self.scale.clone()
+        return state_dict
 
     def load_state_dict(self, state_dict: Dict) -> None:
-        self._scale = state_dict['scale']
+        self._scale.copy_(state_dict['scale'])
+        self._inv_scale = None
 
     @abstractmethod
-    def update(self, overflow: bool) -> None:
+    def update(self, overflow: Union[bool, Tensor]) -> None:
         pass
 
     def log(self, message, *args, **kwargs):
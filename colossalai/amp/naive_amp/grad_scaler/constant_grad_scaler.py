@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
+from torch import Tensor
+from typing import Union
 from .base_grad_scaler import BaseGradScaler
 
 __all__ = ['ConstantGradScaler']
@@ -11,6 +13,6 @@ class ConstantGradScaler(BaseGradScaler):
         super().__init__(initial_scale, verbose)
         self.log(f"Constant Gradient Scaler is initialized with scale {self.scale}", ranks=[0])
 
-    def update(self, overflow: bool) -> None:
+    def update(self, overflow: Union[bool, Tensor]) -> None:
         # do nothing to maintain the current scale value
         pass
@@ -2,8 +2,18 @@
 # -*- encoding: utf-8 -*-
 
 import torch
+from torch import Tensor
+from typing import Union
 from .base_grad_scaler import BaseGradScaler
 
+try:
+    import colossal_C
+except:
+    colossal_C = None
+
+# an extension built before the fused update was added does not have the kernel
+_fused_grad_scaler_update = getattr(colossal_C, 'grad_scaler_update', None)
+
 __all__ = ['DynamicGradScaler']
 
 
@@ -29,12 +39,18 @@ class DynamicGradScaler(BaseGradScaler):
         else:
             self._max_scale = None
 
+        # plain float bounds for the fused update kernel, the missing bounds are no-ops
+        self._min_scale_value = float(min_scale) if min_scale else 0.
+        self._max_scale_value = float(max_scale) if max_scale else float('inf')
+
         self._growth_factor = growth_factor
         self._backoff_factor = backoff_factor
         self._growth_interval = growth_interval
-        self._growth_step = 0
         self._hysteresis = hysteresis
-        self._hysteresis_step = 0
+        # the trackers live on the GPU so that the update
+        # does not need to synchronize with the host
+        self._growth_step = torch.cuda.IntTensor([0])
+        self._hysteresis_step = torch.cuda.IntTensor([0])
         self._sanity_checks()
 
     def _sanity_checks(self) -> None:
@@ -46,31 +62,63 @@ class DynamicGradScaler(BaseGradScaler):
         assert self._backoff_factor < 1 and self._backoff_factor > 0, 'The backoff factor must be between 0 and 1'
         assert self._hysteresis >= 0, 'The hysteresis cannot be negative'
 
-    def update(self, overflow: bool) -> None:
-        if overflow:
-            self._hysteresis_step += 1
-            self._growth_step = 0
+    def update(self, overflow: Union[bool, Tensor]) -> None:
+        # overflow can be a python bool or the overflow flag tensor on the GPU,
+        # in the latter case the whole update is done without blocking the host
+        if torch.is_tensor(overflow):
+            overflow = overflow.int()
+        else:
+            overflow = torch.cuda.IntTensor([overflow])
 
-            if self._hysteresis_step >= self._hysteresis:
-                self._backoff_scale()
-                self.log(f"Overflow occurs, the loss scale is adjusted to {self.scale.item()}", ranks=[0])
+        if self._verbose:
+            prev_scale = self._scale.clone()
+
+        if _fused_grad_scaler_update is not None:
+            self._update_by_kernel(overflow)
         else:
-            self._growth_step += 1
-            if self._growth_step == self._growth_interval:
-                self._growth_step = 0
-                self._hysteresis_step = 0
-                self._grow_scale()
+            self._update_by_torch_ops(overflow)
+
+        if self._verbose:
+            if self._scale.item() < prev_scale.item():
+                self.log(f"Overflow occurs, the loss scale is adjusted to {self.scale.item()}", ranks=[0])
+            elif self._scale.item() > prev_scale.item():
                 self.log(
                     f"No overflow for consecutive {self._growth_interval} steps, "
                     f"the loss scale is adjusted to {self.scale.item()}",
                     ranks=[0])
 
-    def _backoff_scale(self) -> None:
-        self._scale = self._scale * self._backoff_factor
-        if self._min_scale:
-            self._scale = torch.max(self._scale, self._min_scale)
+    def _update_by_kernel(self, overflow: Tensor) -> None:
+        # the scale, its inverse and the trackers are updated in place by a single kernel
+        _fused_grad_scaler_update(self._scale, self.inv_scale, self._growth_step, self._hysteresis_step, overflow,
+                                  self._growth_interval, self._growth_factor, self._backoff_factor,
+                                  self._min_scale_value, self._max_scale_value, self._hysteresis)
 
-    def _grow_scale(self) -> None:
-        self._scale = self._scale * self._growth_factor
-        if self._max_scale:
-            self._scale = torch.min(self._scale, self._max_scale)
+    def _update_by_torch_ops(self, overflow: Tensor) -> None:
+        overflow = overflow.bool()
+        # if overflow occurs, the growth tracker is reset and the hysteresis tracker is increased
+        self._hysteresis_step.add_(overflow.int())
+        self._growth_step.add_(1).masked_fill_(overflow, 0)
+        should_backoff = overflow & (self._hysteresis_step >= self._hysteresis)
+
+        # if no overflow occurs for consecutive growth interval steps, both trackers are reset
+        should_grow = self._growth_step == self._growth_interval
+        self._growth_step.masked_fill_(should_grow, 0)
+        self._hysteresis_step.masked_fill_(should_grow, 0)
+
+        # the scale and its cached inverse are updated in place like the kernel does
+        new_scale = torch.where(should_backoff, self._backoff_scale(),
+                                torch.where(should_grow, self._grow_scale(), self._scale))
+        self._scale.copy_(new_scale)
+        torch.reciprocal(self._scale, out=self.inv_scale)
+
+    def _backoff_scale(self) -> Tensor:
+        scale = self._scale * self._backoff_factor
+        if self._min_scale is not None:
+            scale = torch.max(scale, self._min_scale)
+        return scale
+
+    def _grow_scale(self) -> Tensor:
+        scale = self._scale * self._growth_factor
+        if self._max_scale is not None:
+            scale = torch.min(scale, self._max_scale)
+        return scale
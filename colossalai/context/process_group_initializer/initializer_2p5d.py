@@ -2,7 +2,9 @@
 # -*- encoding: utf-8 -*-
 
 import math
+from typing import Tuple
 
+import numpy as np
 import torch.distributed as dist
 from colossalai.context import Config
 from colossalai.global_variables import tensor_parallel_env as env
@@ -29,9 +31,28 @@ def _check_tesseract_env_var(tesseract_dim: int, tesseract_dep: int):
         env.tesseract_dep = tesseract_dep
 
 
+_TESSERACT_GRID_AXES = 'hkji'
+
+
+def _get_tesseract_rank_grid(num_group: int, tesseract_dim: int, tesseract_dep: int) -> np.ndarray:
+    # the global ranks indexed by [h, k, j, i], where
+    # rank = h * tensor_parallel_size + i + tesseract_dim * (j + tesseract_dim * k)
+    num_ranks = num_group * tesseract_dep * tesseract_dim**2
+    return np.arange(num_ranks).reshape(num_group, tesseract_dep, tesseract_dim, tesseract_dim)
+
+
+def _get_tesseract_coords(rank: int, tesseract_dim: int, tesseract_dep: int):
+    # the (h, i, j, k) coordinates of a global rank in the grid above
+    h, rank_in_tesseract = divmod(rank, tesseract_dep * tesseract_dim**2)
+    k, rank_in_layer = divmod(rank_in_tesseract, tesseract_dim**2)
+    j, i = divmod(rank_in_layer, tesseract_dim)
+    return h, i, j, k
+
+
 # i row j col k dep
-class Initializer_2p5D_ROW(ProcessGroupInitializer):
-    """2p5d tensor parallel initialization among rows.
+class _Initializer_2p5D_Axis(ProcessGroupInitializer):
+    """2p5d tensor parallel initialization along some axes of the tesseract.
+    Subclasses set the parallel mode and the axes whose ranks are gathered into the same group.
 
     :param tesseract_dim: The dimension of tesseract
     :param tesseract_dep: The dimension of depth
@@ -41,8 +62,11 @@ class Initializer_2p5D_ROW(ProcessGroupInitializer):
     :type tesseract_dep: int
     """
 
+    mode: ParallelMode = None
+    group_axes: Tuple[str, ...] = ()
+
     def __init__(self, tesseract_dim: int, tesseract_dep: int, *args):
-        super(Initializer_2p5D_ROW, self).__init__(*args)
+        super().__init__(*args)
         self.num_group = self.world_size // self.tensor_parallel_size
         self.tesseract_dep = tesseract_dep
         self.tesseract_dim = tesseract_dim
@@ -50,37 +74,51 @@ class Initializer_2p5D_ROW(ProcessGroupInitializer):
             "Tensor parallel size should be depth * dim ** 2 in 2.5D parallel"
 
     def init_dist_group(self):
-        """Initialize 2p5D tensor row parallel groups, and assign local_ranks and groups to each gpu.
+        """Initialize 2p5D tensor parallel groups along the group axes, and assign local_ranks and groups to each gpu.
 
-        :return: 2p5D tensor row parallelism's information
+        :return: 2p5D tensor parallelism's information along the group axes
         :rtype: Tuple(local_rank, group_world_size, process_group, ranks_in_group, mode)
         """
         local_rank = None
         ranks_in_group = None
         process_group = None
         group_world_size = None
-        mode = ParallelMode.PARALLEL_2P5D_ROW
-
-        for h in range(self.num_group):
-            for j in range(self.tesseract_dim):
-                for k in range(self.tesseract_dep):
-                    ranks = [
-                        h * self.tensor_parallel_size + i + self.tesseract_dim * (j + self.tesseract_dim * k)
-                        for i in range(self.tesseract_dim)
-                    ]
-                    group = dist.new_group(ranks)
-
-                    if self.rank in ranks:
-                        local_rank = ranks.index(self.rank)
-                        group_world_size = len(ranks)
-                        process_group = group
-                        ranks_in_group = ranks
+        mode = self.mode
+
+        # groups are enumerated by h and the remaining axes in (i, j, k) order,
+        # each collecting the ranks along the group axes
+        axis_sizes = dict(h=self.num_group, i=self.tesseract_dim, j=self.tesseract_dim, k=self.tesseract_dep)
+        outer_axes = ['h'] + [axis for axis in 'ijk' if axis not in self.group_axes]
+        inner_axes = list(self.group_axes)
+        group_size = int(np.prod([axis_sizes[axis] for axis in inner_axes]))
+
+        rank_grid = _get_tesseract_rank_grid(self.num_group, self.tesseract_dim, self.tesseract_dep)
+        perm = [_TESSERACT_GRID_AXES.index(axis) for axis in outer_axes + inner_axes]
+        all_ranks = rank_grid.transpose(perm).reshape(-1, group_size).tolist()
+
+        # every rank has to take part in creating each group,
+        # but the group of the current rank is located analytically
+        coords = dict(zip('hijk', _get_tesseract_coords(self.rank, self.tesseract_dim, self.tesseract_dep)))
+
+        def _flat_index(axes):
+            return int(np.ravel_multi_index([coords[axis] for axis in axes], [axis_sizes[axis] for axis in axes]))
+
+        group_idx = _flat_index(outer_axes)
+
+        for idx, ranks in enumerate(all_ranks):
+            group = dist.new_group(ranks)
+
+            if idx == group_idx:
+                local_rank = _flat_index(inner_axes)
+                group_world_size = len(ranks)
+                process_group = group
+                ranks_in_group = ranks
 
         return local_rank, group_world_size, process_group, ranks_in_group, mode
 
 
-class Initializer_2p5D_Col(ProcessGroupInitializer):
-    """2p5d tensor parallel initialization among cols.
+class Initializer_2p5D_ROW(_Initializer_2p5D_Axis):
+    """2p5d tensor parallel initialization among rows.
 
     :param tesseract_dim: The dimension of tesseract
     :param tesseract_dep: The dimension of depth
@@ -90,45 +128,26 @@ class Initializer_2p5D_Col(ProcessGroupInitializer):
     :type tesseract_dep: int
     """
 
-    def __init__(self, tesseract_dim: int, tesseract_dep: int, *args):
-        super(Initializer_2p5D_Col, self).__init__(*args)
-        self.num_group = self.world_size // self.tensor_parallel_size
-        self.tesseract_dep = tesseract_dep
-        self.tesseract_dim = tesseract_dim
-        assert self.tensor_parallel_size == self.tesseract_dim ** 2 * self.tesseract_dep, \
-            "Tensor parallel size should be depth * dim ** 2 in 2.5D parallel"
+    mode = ParallelMode.PARALLEL_2P5D_ROW
+    group_axes = ('i',)
 
-    def init_dist_group(self):
-        """Initialize 2p5D tensor col parallel groups, and assign local_ranks and groups to each gpu.
 
-        :return: 2p5D tensor col parallelism's information
-        :rtype: Tuple(local_rank, group_world_size, process_group, ranks_in_group, mode)
-        """
-        local_rank = None
-        ranks_in_group = None
-        process_group = None
-        group_world_size = None
-        mode = ParallelMode.PARALLEL_2P5D_COL
-
-        for h in range(self.num_group):
-            for i in range(self.tesseract_dim):
-                for k in range(self.tesseract_dep):
-                    ranks = [
-                        h * self.tensor_parallel_size + i + self.tesseract_dim * (j + self.tesseract_dim * k)
-                        for j in range(self.tesseract_dim)
-                    ]
-                    group = dist.new_group(ranks)
-
-                    if self.rank in ranks:
-                        local_rank = ranks.index(self.rank)
-                        group_world_size = len(ranks)
-                        process_group = group
-                        ranks_in_group = ranks
+class Initializer_2p5D_Col(_Initializer_2p5D_Axis):
+    """2p5d tensor parallel initialization among cols.
 
-        return local_rank, group_world_size, process_group, ranks_in_group, mode
+    :param tesseract_dim: The dimension of tesseract
+    :param tesseract_dep: The dimension of depth
+    :param args: Args used to initialize base class
+
+    :type tesseract_dim: int
+    :type tesseract_dep: int
+    """
+
+    mode = ParallelMode.PARALLEL_2P5D_COL
+    group_axes = ('j',)
 
 
-class Initializer_2p5D_Dep(ProcessGroupInitializer):
+class Initializer_2p5D_Dep(_Initializer_2p5D_Axis):
     """2p5D tensor parallel initialization among depths.
 
     :param tesseract_dim: The dimension of tesseract
@@ -139,46 +158,11 @@ class Initializer_2p5D_Dep(ProcessGroupInitializer):
     :type tesseract_dep: int
     """
 
-    def __init__(self, tesseract_dim: int, tesseract_dep: int, *args):
-        super(Initializer_2p5D_Dep, self).__init__(*args)
-        self.num_group = self.world_size // self.tensor_parallel_size
-        self.tesseract_dep = tesseract_dep
-        self.tesseract_dim = tesseract_dim
-        assert self.tensor_parallel_size == self.tesseract_dim ** 2 * self.tesseract_dep, \
-            "Tensor parallel size should be depth * dim ** 2 in 2.5D parallel"
-
-    def init_dist_group(self):
-        """Initialize 2p5D tensor depth parallel groups, and assign local_ranks and groups to each gpu.
-
-        :return: 2p5D tensor depth parallelism's information
-        :rtype: Tuple(local_rank, group_world_size, process_group, ranks_in_group, mode)
-        """
-        local_rank = None
-        ranks_in_group = None
-        process_group = None
-        group_world_size = None
-        mode = ParallelMode.PARALLEL_2P5D_DEP
-
-        for h in range(self.num_group):
-            for i in range(self.tesseract_dim):
-                for j in range(self.tesseract_dim):
-                    ranks = [
-                        h * self.tensor_parallel_size + i + self.tesseract_dim * (j + self.tesseract_dim * k)
-                        for k in range(self.tesseract_dep)
-                    ]
-                    group = dist.new_group(ranks)
-
-                    if self.rank in ranks:
-                        local_rank = ranks.index(self.rank)
-                        group_world_size = len(ranks)
-                        process_group = group
-                        ranks_in_group = ranks
-
-        return local_rank, group_world_size, process_group, ranks_in_group, mode
+    mode = ParallelMode.PARALLEL_2P5D_DEP
+    group_axes = ('k',)
 
 
-# i row j col k dep
-class Initializer_2p5D_XZ(ProcessGroupInitializer):
+class Initializer_2p5D_XZ(_Initializer_2p5D_Axis):
     """2p5d tensor parallel initialization among cols times dep.
 
     :param tesseract_dim: The dimension of tesseract
@@ -189,42 +173,8 @@ class Initializer_2p5D_XZ(ProcessGroupInitializer):
     :type tesseract_dep: int
     """
 
-    def __init__(self, tesseract_dim: int, tesseract_dep: int, *args):
-        super(Initializer_2p5D_XZ, self).__init__(*args)
-        self.num_group = self.world_size // self.tensor_parallel_size
-        self.tesseract_dep = tesseract_dep
-        self.tesseract_dim = tesseract_dim
-        assert self.tensor_parallel_size == self.tesseract_dim ** 2 * self.tesseract_dep, \
-            "Tensor parallel size should be depth * dim ** 2 in 2.5D parallel"
-
-    def init_dist_group(self):
-        """Initialize 2p5D tensor colXdepth parallel groups, and assign local_ranks and groups to each gpu.
-
-        :return: 2p5D tensor colXdepth parallelism's information
-        :rtype: Tuple(local_rank, group_world_size, process_group, ranks_in_group, mode)
-        """
-        local_rank = None
-        ranks_in_group = None
-        process_group = None
-        group_world_size = None
-        mode = ParallelMode.PARALLEL_2P5D_XZ
-
-        for h in range(self.num_group):
-            for i in range(self.tesseract_dim):
-                ranks = [
-                    h * self.tensor_parallel_size + i + self.tesseract_dim * (j + self.tesseract_dim * k)
-                    for k in range(self.tesseract_dep)
-                    for j in range(self.tesseract_dim)
-                ]
-                group = dist.new_group(ranks)
-
-                if self.rank in ranks:
-                    local_rank = ranks.index(self.rank)
-                    group_world_size = len(ranks)
-                    process_group = group
-                    ranks_in_group = ranks
-
-        return local_rank, group_world_size, process_group, ranks_in_group, mode
+    mode = ParallelMode.PARALLEL_2P5D_XZ
+    group_axes = ('k', 'j')
 
 
 @DIST_GROUP_INITIALIZER.register_module
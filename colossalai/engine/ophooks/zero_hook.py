@@ -30,11 +30,13 @@ class ZeroHook(BaseOpHook):
             assert hasattr(param, 'col_attr')
             tensor_list.append(param.col_attr.data)
         self.shard_strategy.gather(tensor_list)
+        moved_payloads = []
         for param in module.parameters():
             if param.col_attr.data.device != self.computing_device:
                 param.col_attr.data.to(self.computing_device)
-                global_model_data_tracer.add_tensor(param.col_attr.data.payload)
+                moved_payloads.append(param.col_attr.data.payload)
             param.data = param.col_attr.data.payload
+        global_model_data_tracer.add_tensors(moved_payloads)
 
         if self._memstarts_collector:
             self._memstarts_collector.sample_memstats()
@@ -55,10 +57,11 @@ class ZeroHook(BaseOpHook):
             assert hasattr(param, 'col_attr')
             tensor_list.append(param.col_attr.data)
         self.shard_strategy.gather(tensor_list)
+        moved_payloads = []
         for param in module.parameters():
             if param.col_attr.data.device != self.computing_device:
                 param.col_attr.data.to(self.computing_device)
-                global_model_data_tracer.add_tensor(param.col_attr.data.payload)
+                moved_payloads.append(param.col_attr.data.payload)
             param.data = param.col_attr.data.payload
             # Store local accumulated grad shard
             if param.grad is not None:
@@ -72,6 +75,7 @@ class ZeroHook(BaseOpHook):
                     # The grad here must be locally computed full grad in this backward pass
                     assert param.grad.shape == param.col_attr.data.origin_shape
             param.col_attr.bwd_count += 1
+        global_model_data_tracer.add_tensors(moved_payloads)
         if self._memstarts_collector:
             self._memstarts_collector.sample_memstats()
 
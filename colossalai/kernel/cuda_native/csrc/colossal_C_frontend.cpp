@@ -56,6 +56,19 @@ std::tuple<at::Tensor, at::Tensor> multi_tensor_l2norm_cuda(
     std::vector<std::vector<at::Tensor>> tensor_lists,
     at::optional<bool> per_tensor_python);
 
+void grad_scaler_update_cuda(
+    at::Tensor scale,
+    at::Tensor inv_scale,
+    at::Tensor growth_tracker,
+    at::Tensor hysteresis_tracker,
+    at::Tensor found_inf,
+    const int growth_interval,
+    const float growth_factor,
+    const float backoff_factor,
+    const float min_scale,
+    const float max_scale,
+    const int hysteresis);
+
 PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
 {
     m.def("multi_tensor_scale", &multi_tensor_scale_cuda,
@@ -68,4 +81,6 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
           "Computes and apply update for LAMB optimizer");
     m.def("multi_tensor_l2norm", &multi_tensor_l2norm_cuda,
           "Computes L2 norm for a list of contiguous tensors");
+    m.def("grad_scaler_update", &grad_scaler_update_cuda,
+          "Updates the dynamic loss scale, its inverse and its trackers in place");
 }
\ No newline at end of file
@@ -0,0 +1,88 @@
+#include <ATen/ATen.h>
+#include <ATen/cuda/CUDAContext.h>
+#include <ATen/cuda/Exceptions.h>
+#include <c10/cuda/CUDAGuard.h>
+
+// Runs the whole dynamic loss scale state machine in a single thread,
+// so that a training step only pays one tiny kernel launch for it
+// and the host never has to wait for the overflow flag.
+__global__ void grad_scaler_update_kernel(
+    float* scale,
+    float* inv_scale,
+    int* growth_tracker,
+    int* hysteresis_tracker,
+    const int* found_inf,
+    const int growth_interval,
+    const float growth_factor,
+    const float backoff_factor,
+    const float min_scale,
+    const float max_scale,
+    const int hysteresis)
+{
+  if (*found_inf)
+  {
+    // overflow resets the growth tracker and increases the hysteresis tracker
+    *growth_tracker = 0;
+    *hysteresis_tracker += 1;
+    if (*hysteresis_tracker >= hysteresis)
+      *scale = fmaxf((*scale) * backoff_factor, min_scale);
+  }
+  else
+  {
+    int successful = *growth_tracker + 1;
+    if (successful == growth_interval)
+    {
+      // no overflow for consecutive growth interval steps, both trackers are reset
+      *growth_tracker = 0;
+      *hysteresis_tracker = 0;
+      *scale = fminf((*scale) * growth_factor, max_scale);
+    }
+    else
+    {
+      *growth_tracker = successful;
+    }
+  }
+  // keep the inverse scale in sync, the rounded reciprocal is exact like torch.reciprocal
+  *inv_scale = __frcp_rn(*scale);
+}
+
+void grad_scaler_update_cuda(
+    at::Tensor scale,
+    at::Tensor inv_scale,
+    at::Tensor growth_tracker,
+    at::Tensor hysteresis_tracker,
+    at::Tensor found_inf,
+    const int growth_interval,
+    const float growth_factor,
+    const float backoff_factor,
+    const float min_scale,
+    const float max_scale,
+    const int hysteresis)
+{
+  TORCH_CHECK(scale.is_cuda(), "scale must be a CUDA tensor");
+  TORCH_CHECK(scale.numel() == 1 && inv_scale.numel() == 1 && growth_tracker.numel() == 1 &&
+              hysteresis_tracker.numel() == 1 && found_inf.numel() == 1,
+              "scale, inv_scale, trackers and found_inf must be one-element tensors");
+  TORCH_CHECK(scale.scalar_type() == at::ScalarType::Float && inv_scale.scalar_type() == at::ScalarType::Float,
+              "scale and inv_scale must be float tensors");
+  TORCH_CHECK(growth_tracker.scalar_type() == at::ScalarType::Int &&
+              hysteresis_tracker.scalar_type() == at::ScalarType::Int &&
+              found_inf.scalar_type() == at::ScalarType::Int,
+              "trackers and found_inf must be int tensors");
+
+  const at::cuda::OptionalCUDAGuard device_guard(device_of(scale));
+  auto stream = at::cuda::getCurrentCUDAStream();
+  grad_scaler_update_kernel<<<1, 1, 0, stream>>>(
+      scale.data_ptr<float>(),
+      inv_scale.data_ptr<float>(),
+      growth_tracker.data_ptr<int>(),
+      hysteresis_tracker.data_ptr<int>(),
+      found_inf.data_ptr<int>(),
+      growth_interval,
+      growth_factor,
+      backoff_factor,
+      min_scale,
+      max_scale,
+      hysteresis);
+  AT_CUDA_CHECK(cudaGetLastError());
+}
@@ -1,6 +1,7 @@
 from colossalai.utils.commons.singleton_meta import SingletonMeta
 from colossalai.utils.memory_tracer.commons import col_tensor_mem_usage
 import torch
+from typing import List
 
 
 class ModelDataTracer(metaclass=SingletonMeta):
@@ -25,9 +26,13 @@ class ModelDataTracer(metaclass=SingletonMeta):
         mem_use = col_tensor_mem_usage(t)
         self._cuda_usage -= mem_use
 
-    @property
-    def cpu_usage(self):
-        return self._cpu_usage
+    def add_tensors(self, ts: List[torch.Tensor]):
+        """Batched version of add_tensor(), which accumulates the usage of all tensors in one pass"""
+        self._cuda_usage += sum(col_tensor_mem_usage(t) for t in ts)
+
+    def delete_tensors(self, ts: List[torch.Tensor]):
+        """Batched version of delete_tensor(), which releases the usage of all tensors in one pass"""
+        self._cuda_usage -= sum(col_tensor_mem_usage(t) for t in ts)
 
     @property
     def cuda_usage(self):
@@ -1,12 +1,18 @@
 import math
 import torch
+from collections import defaultdict
 from torch._six import inf
 from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
 from colossalai.core import global_context as gpc
 from colossalai.context import ParallelMode
-from colossalai.utils import is_model_parallel_parameter
+from colossalai.utils import is_model_parallel_parameter, multi_tensor_applier
 import torch.distributed as dist
 
+try:
+    import colossal_C
+except:
+    colossal_C = None
+
 
 def move_tensor(input_, device):
     assert device in ['cpu', 'gpu']
@@ -187,6 +193,33 @@ def has_inf_or_nan(tensor):
         return False
 
 
+def check_overflow_by_list(tensor_list, found_overflow):
+    """
+    Set found_overflow to 1 if any tensor in tensor_list contains inf or nan.
+    Contiguous CUDA tensors are checked by a single multi_tensor_l2norm launch per device and dtype,
+    which raises its overflow flag on non-finite values, instead of one reduction per tensor.
+    The kernel accumulates into an int32 flag on found_overflow's device directly.
+    """
+    # the fused check needs the cuda extension, otherwise every tensor is checked on its own
+    use_fused_check = colossal_C is not None and multi_tensor_applier.available
+    fused_dtypes = (torch.float16, torch.float32)
+    cuda_tensor_groups = defaultdict(list)
+    for tensor in tensor_list:
+        if use_fused_check and tensor.is_cuda and tensor.dtype in fused_dtypes and tensor.is_contiguous():
+            cuda_tensor_groups[(tensor.device, tensor.dtype)].append(tensor)
+        elif has_inf_or_nan(tensor):
+            found_overflow.fill_(1)
+
+    for (device, _), tensors in cuda_tensor_groups.items():
+        if found_overflow.device == device and found_overflow.dtype == torch.int:
+            multi_tensor_applier(colossal_C.multi_tensor_l2norm, found_overflow, [tensors], False)
+        else:
+            # the kernel needs its flag on the device of the tensors
+            overflow_buf = torch.zeros(1, dtype=torch.int, device=device)
+            multi_tensor_applier(colossal_C.multi_tensor_l2norm, overflow_buf, [tensors], False)
+            found_overflow.logical_or_(overflow_buf.to(found_overflow.device))
+
+
 def release_param_grad(tensor_list):
     for tensor in tensor_list:
         tensor.grad = None
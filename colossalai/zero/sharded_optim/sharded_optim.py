@@ -9,7 +9,8 @@ from colossalai.core import global_context as gpc
 from colossalai.amp.naive_amp.grad_scaler import DynamicGradScaler
 from colossalai.nn.optimizer import ColossalaiOptimizer
 from ._utils import (move_tensor, flatten, get_grad_accumulate_object, split_half_float_double, reduce_tensor,
-                     release_param_grad, calculate_global_norm_from_list, compute_norm, sync_param, has_inf_or_nan)
+                     release_param_grad, calculate_global_norm_from_list, compute_norm, sync_param,
+                     check_overflow_by_list)
 from functools import partial
 
 
@@ -85,7 +86,7 @@ class ShardedOptimizer(ColossalaiOptimizer):
                                              hysteresis=hysteresis,
                                              max_scale=max_scale,
                                              verbose=verbose)
-        self._found_overflow = torch.FloatTensor([0]).to(get_current_device())
+        self._found_overflow = torch.IntTensor([0]).to(get_current_device())
 
         # gradient clipping
         self._clip_grad_norm = clip_grad_norm
@@ -464,14 +465,15 @@ class ShardedOptimizer(ColossalaiOptimizer):
 
     def _check_overflow(self):
         # clear previous overflow record
-        self._found_overflow.fill_(0.0)
+        self._found_overflow.fill_(0)
 
         # check for overflow
+        avg_grads = []
         for group_id in range(len(self._fp16_param_groups)):
             for avg_grad in self._grad_store.get_averaged_gradients_by_group(group_id):
-                if avg_grad is not None and has_inf_or_nan(avg_grad):
-                    self._found_overflow.fill_(1.0)
-                    break
+                if avg_grad is not None:
+                    avg_grads.append(avg_grad)
+        check_overflow_by_list(avg_grads, self._found_overflow)
 
         # all-reduce across dp group
         dist.all_reduce(self._found_overflow, op=dist.ReduceOp.MAX, group=self._dp_group)
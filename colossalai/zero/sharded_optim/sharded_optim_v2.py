@@ -16,7 +16,7 @@ from torch.distributed import ProcessGroup
 from torch.nn.parameter import Parameter
 from torch.optim import Optimizer
 from typing import Type, Any
-from ._utils import has_inf_or_nan
+from ._utils import check_overflow_by_list
 
 
 class OptimState(Enum):
@@ -107,7 +107,7 @@ class ShardedOptimizerV2(ColossalaiOptimizer):
                                              growth_interval=growth_interval,
                                              hysteresis=hysteresis,
                                              max_scale=max_scale)
-        self._found_overflow: Tensor = torch.FloatTensor([0]).to(torch.cuda.current_device())
+        self._found_overflow: Tensor = torch.IntTensor([0]).to(torch.cuda.current_device())
 
         # Store fp32 param shards
         self.master_params: Dict[Parameter, Tensor] = {}
@@ -193,14 +193,11 @@ class ShardedOptimizerV2(ColossalaiOptimizer):
 
     def _check_overflow(self):
         # clear previous overflow record
-        self._found_overflow.fill_(0.0)
+        self._found_overflow.fill_(0)
 
         # check for overflow
-        for group in self.optim.param_groups:
-            for p in group['params']:
-                if has_inf_or_nan(p.grad):
-                    self._found_overflow.fill_(1.0)
-                    break
+        grads = [p.grad for group in self.optim.param_groups for p in group['params'] if p.grad is not None]
+        check_overflow_by_list(grads, self._found_overflow)
 
         # all-reduce across dp group
         dist.all_reduce(self._found_overflow, op=dist.ReduceOp.MAX, group=self.dp_process_group)
@@ -212,10 +209,10 @@ class ShardedOptimizerV2(ColossalaiOptimizer):
 
     def _unscale_grads(self):
         assert self.optim_state == OptimState.SCALED
-        for group in self.optim.param_groups:
-            for p in group['params']:
-                if p.grad is not None:
-                    p.grad.data.div_(self.loss_scale)
+        grads = [p.grad.data for group in self.optim.param_groups for p in group['params'] if p.grad is not None]
+        if grads:
+            # read the loss scale once and unscale all grads with a single multi-tensor op
+            torch._foreach_div_(grads, self.loss_scale)
         self.optim_state = OptimState.UNSCALED
 
     def zero_grad(self, *args, **kwargs):
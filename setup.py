@@ -137,7 +137,8 @@ if build_cuda_ext:
     ext_modules.append(
         cuda_ext_helper('colossal_C', [
             'colossal_C_frontend.cpp', 'multi_tensor_sgd_kernel.cu', 'multi_tensor_scale_kernel.cu',
-            'multi_tensor_adam.cu', 'multi_tensor_l2norm_kernel.cu', 'multi_tensor_lamb.cu'
+            'multi_tensor_adam.cu', 'multi_tensor_l2norm_kernel.cu', 'multi_tensor_lamb.cu',
+            'grad_scaler_update_kernel.cu'
         ], ['-lineinfo']))
 
     cc_flag = ['-gencode', 'arch=compute_70,code=sm_70']
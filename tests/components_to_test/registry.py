@@ -5,6 +5,7 @@ class Registry:
 
     def __init__(self):
         self._registry = dict()
+        self._components = dict()
 
     def register(self, name):
         assert name not in self._registry
@@ -17,6 +18,13 @@ class Registry:
     def get_callable(self, name: str):
         return self._registry[name]
 
+    def get_components(self, name: str):
+        # building the components (e.g. datasets) can be expensive,
+        # so they are built once per process and reused by later test cases
+        if name not in self._components:
+            self._components[name] = self._registry[name]()
+        return self._components[name]
+
     def __iter__(self):
         self._idx = 0
         self._len = len(self._registry)
@@ -16,7 +16,7 @@ def get_cifar10_dataloader(train):
                       transform=transforms.Compose(
                           [transforms.ToTensor(),
                            transforms.Normalize(mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5))]))
-    dataloader = get_dataloader(dataset=dataset, shuffle=True, batch_size=16, drop_last=True)
+    dataloader = get_dataloader(dataset=dataset, shuffle=True, batch_size=16, drop_last=True, pin_memory=True)
     return dataloader
 
 
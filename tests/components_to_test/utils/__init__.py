@@ -1 +1,2 @@
-from .dummy_data_generator import DummyDataGenerator
+from .dummy_data_generator import DummyDataGenerator
+from .module_utils import clone_cuda_module
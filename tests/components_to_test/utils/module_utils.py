@@ -0,0 +1,19 @@
+from itertools import chain
+from typing import Callable
+
+import torch
+import torch.nn as nn
+
+
+def clone_cuda_module(builder: Callable[..., nn.Module], ref: nn.Module, **kwargs) -> nn.Module:
+    """
+    Build a new module with the builder and copy the parameters and buffers of the reference module into it.
+    This is much cheaper than deepcopy as it skips walking the whole module in python,
+    but the gradients and hooks of the reference module are not cloned.
+    """
+    ref_tensor = next(chain(ref.parameters(), ref.buffers()))
+    module = builder(**kwargs).to(device=ref_tensor.device, dtype=ref_tensor.dtype)
+    with torch.no_grad():
+        for dst, src in zip(chain(module.parameters(), module.buffers()), chain(ref.parameters(), ref.buffers())):
+            dst.copy_(src, non_blocking=True)
+    return module
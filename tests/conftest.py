@@ -0,0 +1,39 @@
+import socket
+
+import pytest
+from colossalai.utils import free_port
+
+
+class PortPool:
+    """
+    A pool of ports reserved up front, each port is held by a bound socket until it is popped,
+    so that concurrent test processes cannot race for the same port.
+    """
+
+    def __init__(self, size=32):
+        self._sockets = []
+        for _ in range(size):
+            sock = socket.socket()
+            sock.bind(('localhost', 0))
+            self._sockets.append(sock)
+
+    def pop(self) -> int:
+        if not self._sockets:
+            return free_port()
+        # the reservation is only released right before the port is handed to the launcher
+        sock = self._sockets.pop()
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def close(self):
+        for sock in self._sockets:
+            sock.close()
+        self._sockets.clear()
+
+
+@pytest.fixture(scope='session')
+def port_pool():
+    pool = PortPool()
+    yield pool
+    pool.close()
@@ -0,0 +1,100 @@
+import pytest
+import torch
+from colossalai.amp.naive_amp.grad_scaler import DynamicGradScaler
+from colossalai.amp.naive_amp.grad_scaler.dynamic_grad_scaler import _fused_grad_scaler_update
+
+SCALER_CONFIG = dict(initial_scale=4,
+                     growth_factor=2,
+                     backoff_factor=0.5,
+                     growth_interval=3,
+                     min_scale=1,
+                     max_scale=16,
+                     hysteresis=2)
+
+# grow until max_scale is reached, overflow once within hysteresis, then overflow until min_scale is reached,
+# an overflow in the middle of a growth interval resets the growth tracker
+OVERFLOW_PATTERN = [False] * 9 + [True] + [False] * 3 + [True] * 6 + [False, False, True] + [False] * 6
+
+
+class ReferenceScaler:
+    """
+    A host implementation of the dynamic loss scale state machine
+    """
+
+    def __init__(self, initial_scale, growth_factor, backoff_factor, growth_interval, min_scale, max_scale, hysteresis):
+        self.scale = float(initial_scale)
+        self.growth_factor = growth_factor
+        self.backoff_factor = backoff_factor
+        self.growth_interval = growth_interval
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.hysteresis = hysteresis
+        self.growth_step = 0
+        self.hysteresis_step = 0
+
+    def update(self, overflow):
+        if overflow:
+            self.growth_step = 0
+            self.hysteresis_step += 1
+            if self.hysteresis_step >= self.hysteresis:
+                self.scale = max(self.scale * self.backoff_factor, self.min_scale)
+        else:
+            self.growth_step += 1
+            if self.growth_step == self.growth_interval:
+                self.growth_step = 0
+                self.hysteresis_step = 0
+                self.scale = min(self.scale * self.growth_factor, self.max_scale)
+
+
+def check_scaler_update(update_method):
+    scaler = DynamicGradScaler(**SCALER_CONFIG)
+    reference = ReferenceScaler(**SCALER_CONFIG)
+    scale = scaler.scale
+    inv_scale = scaler.inv_scale
+    visited_scales = set()
+    for step, overflow in enumerate(OVERFLOW_PATTERN):
+        getattr(scaler, update_method)(torch.cuda.IntTensor([overflow]))
+        reference.update(overflow)
+        visited_scales.add(reference.scale)
+        assert scaler.scale.item() == reference.scale, f'scale mismatches at step {step}'
+        assert scaler._growth_step.item() == reference.growth_step, f'growth tracker mismatches at step {step}'
+        assert scaler._hysteresis_step.item() == reference.hysteresis_step, \
+            f'hysteresis tracker mismatches at step {step}'
+        assert scaler.inv_scale.item() == 1 / reference.scale, f'inverse scale mismatches at step {step}'
+        # the scale and its inverse are updated in place
+        assert scaler.scale is scale
+        assert scaler.inv_scale is inv_scale
+    # the pattern covers both bounds
+    assert {SCALER_CONFIG['min_scale'], SCALER_CONFIG['max_scale']} <= visited_scales
+
+
+@pytest.mark.gpu
+def test_torch_ops_update():
+    check_scaler_update('_update_by_torch_ops')
+
+
+@pytest.mark.gpu
+@pytest.mark.skipif(_fused_grad_scaler_update is None, reason='colossal_C is not built with grad_scaler_update')
+def test_kernel_update():
+    check_scaler_update('_update_by_kernel')
+
+
+@pytest.mark.gpu
+def test_state_dict_is_detached():
+    scaler = DynamicGradScaler(**SCALER_CONFIG)
+    state_dict = scaler.state_dict()
+    for _ in range(SCALER_CONFIG['growth_interval']):
+        scaler.update(False)
+    assert state_dict['scale'].item() == SCALER_CONFIG['initial_scale']
+
+    scaler.load_state_dict(state_dict)
+    scaler.update(True)
+    scaler.update(True)
+    assert scaler.scale.item() == SCALER_CONFIG['initial_scale'] * SCALER_CONFIG['backoff_factor']
+    assert state_dict['scale'].item() == SCALER_CONFIG['initial_scale']
+
+
+if __name__ == '__main__':
+    test_torch_ops_update()
+    test_kernel_update()
+    test_state_dict_is_detached()
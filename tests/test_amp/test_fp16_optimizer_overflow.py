@@ -0,0 +1,75 @@
+import colossalai
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from colossalai.amp.naive_amp._fp16_optimizer import FP16Optimizer
+from colossalai.amp.naive_amp.grad_scaler import ConstantGradScaler
+from colossalai.context import ParallelMode
+from colossalai.core import global_context as gpc
+from colossalai.utils import free_port
+from functools import partial
+
+CONFIG = dict(parallel=dict(tensor=dict(size=2, mode='1d')))
+
+
+def new_user_groups():
+    """
+    Create dp and mp groups with the same ranks as the default groups of the global context,
+    which are still treated as user-supplied groups by the optimizer
+    """
+    rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    tp_size = gpc.get_world_size(ParallelMode.TENSOR)
+    dp_group, mp_group = None, None
+    for start in range(0, world_size, tp_size):
+        group = dist.new_group(list(range(start, start + tp_size)))
+        if rank in range(start, start + tp_size):
+            mp_group = group
+    for offset in range(tp_size):
+        group = dist.new_group(list(range(offset, world_size, tp_size)))
+        if rank % tp_size == offset:
+            dp_group = group
+    return dp_group, mp_group
+
+
+def check_overflow_is_reduced(optimizer, overflow_rank):
+    for found_inf in (False, True):
+        for param in optimizer._fp16_param_groups[0]:
+            param.grad = torch.ones_like(param)
+            if found_inf and dist.get_rank() == overflow_rank:
+                param.grad.fill_(float('inf'))
+        success, _ = optimizer.step()
+        assert success != found_inf, f'the overflow on rank {overflow_rank} is not seen by rank {dist.get_rank()}'
+
+
+def run_dist(rank, world_size, port):
+    colossalai.launch(config=CONFIG, rank=rank, world_size=world_size, port=port, host='localhost', backend='nccl')
+
+    # the default groups of the global context are reduced in a single all-reduce over the world
+    model = nn.Linear(4, 4).cuda().half()
+    optimizer = FP16Optimizer(torch.optim.SGD(model.parameters(), lr=1e-3), ConstantGradScaler(1, verbose=False))
+    assert optimizer._overflow_process_groups == [dist.group.WORLD]
+    check_overflow_is_reduced(optimizer, overflow_rank=world_size - 1)
+
+    # user-supplied groups are reduced one by one
+    dp_group, mp_group = new_user_groups()
+    model = nn.Linear(4, 4).cuda().half()
+    optimizer = FP16Optimizer(torch.optim.SGD(model.parameters(), lr=1e-3),
+                              ConstantGradScaler(1, verbose=False),
+                              dp_process_group=dp_group,
+                              mp_process_group=mp_group)
+    assert optimizer._overflow_process_groups == [dp_group, mp_group]
+    check_overflow_is_reduced(optimizer, overflow_rank=world_size - 1)
+
+
+@pytest.mark.dist
+def test_fp16_optimizer_overflow(port_pool):
+    world_size = 4
+    run_func = partial(run_dist, world_size=world_size, port=port_pool.pop())
+    mp.start_processes(run_func, nprocs=world_size, join=True, start_method='forkserver')
+
+
+if __name__ == '__main__':
+    test_fp16_optimizer_overflow(port_pool=[free_port()])
@@ -0,0 +1,95 @@
+import pytest
+import torch
+import torch.nn as nn
+from colossalai.amp.naive_amp._fp16_optimizer import FP16Optimizer
+from colossalai.amp.naive_amp._utils import is_bf16_supported
+from colossalai.amp.naive_amp.grad_scaler import ConstantGradScaler
+
+
+def build_optimizer(master_dtype, optimizer=None):
+    if optimizer is None:
+        model = nn.Sequential(nn.Linear(4, 8), nn.Linear(8, 4)).cuda().half()
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    return FP16Optimizer(optimizer, ConstantGradScaler(1, verbose=False), master_dtype=master_dtype)
+
+
+def run_step(optimizer):
+    torch.manual_seed(0)
+    for param in optimizer._fp16_param_groups[0]:
+        param.grad = torch.randn_like(param)
+    success, _ = optimizer.step()
+    assert success
+
+
+def clone_state(state):
+    # the step counter is a python number in older torch versions
+    return {k: v.clone() if torch.is_tensor(v) else v for k, v in state.items()}
+
+
+def check_state(state, ref_state, dtype):
+    for key, ref_value in ref_state.items():
+        value = state[key]
+        if not torch.is_tensor(ref_value):
+            assert value == ref_value
+        elif key == 'step':
+            # the step counter keeps its dtype for the bias correction
+            assert value.dtype == ref_value.dtype and torch.equal(value.cpu(), ref_value.cpu())
+        else:
+            assert value.dtype == dtype and torch.equal(value, ref_value.to(dtype))
+
+
+def skip_if_bf16_unsupported(master_dtype):
+    if master_dtype == torch.bfloat16 and not is_bf16_supported():
+        pytest.skip('bf16 master params need a GPU with native bfloat16 support')
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize("master_dtype", [torch.float32, torch.bfloat16])
+def test_state_is_cast_to_master_params(master_dtype):
+    skip_if_bf16_unsupported(master_dtype)
+    # the state of an optimizer stepped on the fp16 params is moved to the master params
+    model = nn.Sequential(nn.Linear(4, 8), nn.Linear(8, 4)).cuda().half()
+    torch_optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    for param in model.parameters():
+        param.grad = torch.randn_like(param)
+    torch_optimizer.step()
+    ref_states = [clone_state(torch_optimizer.state[p]) for p in model.parameters()]
+
+    optimizer = build_optimizer(master_dtype, torch_optimizer)
+    for master_param, ref_state in zip(optimizer._fp32_master_param_groups[0], ref_states):
+        check_state(optimizer.state[master_param], ref_state, master_dtype)
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize("master_dtype", [torch.float32, torch.bfloat16])
+def test_state_dict_round_trip(master_dtype):
+    skip_if_bf16_unsupported(master_dtype)
+    # the state saved with fp32 master params is loaded with master params of another dtype
+    src_optimizer = build_optimizer(torch.float32)
+    run_step(src_optimizer)
+    state_dict = src_optimizer.state_dict()
+    ref_states = [clone_state(src_optimizer.state[p]) for p in src_optimizer._fp32_master_param_groups[0]]
+
+    dst_optimizer = build_optimizer(master_dtype)
+    dst_optimizer.load_state_dict(state_dict)
+    for master_param, ref_state in zip(dst_optimizer._fp32_master_param_groups[0], ref_states):
+        check_state(dst_optimizer.state[master_param], ref_state, master_dtype)
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize("master_dtype", [torch.float32, torch.bfloat16])
+def test_load_master_params(master_dtype):
+    skip_if_bf16_unsupported(master_dtype)
+    src_optimizer = build_optimizer(torch.float32)
+    run_step(src_optimizer)
+    state_dict = src_optimizer.state_dict()
+
+    dst_optimizer = build_optimizer(master_dtype)
+    master_params = dst_optimizer._fp32_master_param_groups[0]
+    data_ptrs = [p.data_ptr() for p in master_params]
+    dst_optimizer.load_state_dict(state_dict)
+
+    # the checkpointed params are copied into the flat buffer, which still backs the master params
+    for master_param, data_ptr, src_param in zip(master_params, data_ptrs, src_optimizer._fp32_master_param_groups[0]):
+        assert master_param.data_ptr() == data_ptr
+        assert master_param.dtype == master_dtype and torch.equal(master_param, src_param.to(master_dtype))
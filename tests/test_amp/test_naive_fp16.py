@@ -1,10 +1,12 @@
 import torch
 import colossalai
-import copy
 import pytest
 import torch.multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from colossalai.amp import convert_to_naive_amp
+from colossalai.amp.naive_amp._utils import is_bf16_supported
 from tests.components_to_test.registry import non_distributed_component_funcs
+from tests.components_to_test.utils import clone_cuda_module
 from colossalai.utils import free_port
 from functools import partial
 
@@ -16,11 +18,32 @@ def check_equal(a, b):
     assert torch.allclose(a.float(), b.float(), rtol=1e-4, atol=1e-3), f'a = {a}, b = {b}'
 
 
-def run_naive_amp():
+def allclose_lists(a_list, b_list, rtol=1e-3, atol=1e-3):
+    """
+    This function checks if two lists of tensors are equal within tolerance,
+    the element-wise check is done with multi-tensor ops instead of one allclose per tensor
+    """
+    diffs = torch._foreach_sub(a_list, b_list)
+    torch._foreach_abs_(diffs)
+    tols = torch._foreach_abs(b_list)
+    torch._foreach_mul_(tols, rtol)
+    torch._foreach_add_(tols, atol)
+    torch._foreach_sub_(diffs, tols)
+    # nan is propagated by max and fails the comparison
+    return torch.stack([diff.max().float() for diff in diffs]).max().item() <= 0
+
+
+def run_naive_amp(master_dtype=torch.float32):
     """
     In this test, we compare the naive fp16 optimizer implemented in colossalai 
     and fp32 torch optimizer
     """
+    # bf16 master params only keep 8 bits of mantissa, so the updated params are checked more loosely
+    param_tol = 1e-3 if master_dtype == torch.float32 else 1e-2
+
+    # the checks of the updated params run in the background while the next model is built and trained
+    executor = ThreadPoolExecutor(max_workers=1)
+    param_checks = dict()
 
     # create layer
     test_models = ['repeated_computed_layers', 'nested_model']
@@ -30,14 +53,14 @@ def run_naive_amp():
 
         # create model
         amp_model = model_builder(checkpoint=True).cuda()
-        torch_model = copy.deepcopy(amp_model)
+        torch_model = clone_cuda_module(model_builder, amp_model, checkpoint=True)
 
         # create optimizer
         amp_optimizer = optim_builder(amp_model)
         torch_optimizer = optim_builder(torch_model)
 
         # inject naive amp
-        amp_config = dict(initial_scale=1)
+        amp_config = dict(initial_scale=1, master_dtype=master_dtype)
         amp_model, amp_optimizer = convert_to_naive_amp(amp_model, amp_optimizer, amp_config)
 
         # create data
@@ -45,39 +68,65 @@ def run_naive_amp():
         data, label = next(data_iter)
         data = data.cuda()
 
-        # forward pass
-        amp_output = amp_model(data)
-        torch_output = torch_model(data)
+        # forward and backward pass
+        # the two models are independent, so they are run concurrently on their own streams
+        amp_stream, torch_stream = torch.cuda.Stream(), torch.cuda.Stream()
+        amp_stream.wait_stream(torch.cuda.current_stream())
+        torch_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(amp_stream):
+            amp_output = amp_model(data)
+            amp_optimizer.backward(amp_output.mean())
+        with torch.cuda.stream(torch_stream):
+            torch_output = torch_model(data)
+            torch_output.mean().backward()
+        torch.cuda.synchronize()
         assert torch.allclose(amp_output, torch_output, rtol=1e-3, atol=1e-3), f'{amp_output} vs {torch_output}'
 
-        # backward
-        amp_optimizer.backward(amp_output.mean())
-        torch_output.mean().backward()
-
         # check grad
-        for amp_param, torch_param in zip(amp_model.parameters(), torch_model.parameters()):
-            torch.allclose(amp_param.grad, torch_param.grad.half(), rtol=1e-3, atol=1e-3)
+        amp_grads = [p.grad for p in amp_model.parameters()]
+        torch_grads = [p.grad.half() for p in torch_model.parameters()]
+        assert allclose_lists(amp_grads, torch_grads), 'grads of the amp model and the torch model are different'
 
         # step
         amp_optimizer.step()
         torch_optimizer.step()
 
         # check updated param
-        for amp_param, torch_param in zip(amp_model.parameters(), torch_model.parameters()):
-            torch.allclose(amp_param, torch_param.half(), rtol=1e-3, atol=1e-3)
+        # the params are cloned as the amp model is stepped again below while they are being checked
+        amp_params = [p.data.clone() for p in amp_model.parameters()]
+        torch_params = [p.data.half() for p in torch_model.parameters()]
+        param_checks[test_name] = executor.submit(allclose_lists, amp_params, torch_params, param_tol, param_tol)
+
+        # the step is skipped if the grads overflow
+        amp_output = amp_model(data)
+        amp_optimizer.backward(amp_output.mean())
+        next(amp_model.parameters()).grad.fill_(float('inf'))
+        success, _ = amp_optimizer.step()
+        assert not success, 'the step should be skipped when the grads overflow'
+        for amp_param, prev_param in zip(amp_model.parameters(), amp_params):
+            assert torch.equal(amp_param.data, prev_param), 'params should not be updated when the grads overflow'
+
+    for test_name, param_check in param_checks.items():
+        assert param_check.result(), f'params of the amp model and the torch model are different for {test_name}'
+    executor.shutdown()
 
 
-def run_dist(rank, world_size, port):
-    colossalai.launch(config=dict(), rank=rank, world_size=world_size, port=port, host='localhost')
-    run_naive_amp()
+def run_dist(rank, world_size, port, master_dtype):
+    # a single rank does not need nccl communicators, gloo is much cheaper to initialize
+    backend = 'gloo' if world_size == 1 else 'nccl'
+    colossalai.launch(config=dict(), rank=rank, world_size=world_size, port=port, host='localhost', backend=backend)
+    run_naive_amp(master_dtype)
 
 
 @pytest.mark.dist
-def test_naive_amp():
+@pytest.mark.parametrize("master_dtype", [torch.float32, torch.bfloat16])
+def test_naive_amp(port_pool, master_dtype):
+    if master_dtype == torch.bfloat16 and not is_bf16_supported():
+        pytest.skip('bf16 master params need a GPU with native bfloat16 support')
     world_size = 1
-    run_func = partial(run_dist, world_size=world_size, port=free_port())
-    mp.spawn(run_func, nprocs=world_size)
+    run_func = partial(run_dist, world_size=world_size, port=port_pool.pop(), master_dtype=master_dtype)
+    mp.start_processes(run_func, nprocs=world_size, join=True, start_method='forkserver')
 
 
 if __name__ == '__main__':
-    test_naive_amp()
+    test_naive_amp(port_pool=[free_port()], master_dtype=torch.bfloat16)
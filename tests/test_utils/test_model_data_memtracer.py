@@ -0,0 +1,31 @@
+import torch
+from colossalai.utils.memory_tracer.model_data_memtracer import ModelDataTracer
+
+
+def test_model_data_memtracer_batched():
+    tracer = ModelDataTracer()
+    tensors = [torch.empty(3, 5), torch.empty(7, dtype=torch.half), torch.empty(2, 2, dtype=torch.long)]
+
+    # the batched apis should match the accumulated usage of the per-tensor apis
+    base_usage = tracer.cuda_usage
+    for t in tensors:
+        tracer.add_tensor(t)
+    single_usage = tracer.cuda_usage - base_usage
+    for t in tensors:
+        tracer.delete_tensor(t)
+    assert tracer.cuda_usage == base_usage
+
+    tracer.add_tensors(tensors)
+    assert tracer.cuda_usage - base_usage == single_usage == 3 * 5 * 4 + 7 * 2 + 2 * 2 * 8
+    tracer.delete_tensors(tensors)
+    assert tracer.cuda_usage == base_usage
+
+    # an empty list does not change the usage
+    tracer.add_tensors([])
+    assert tracer.cuda_usage == base_usage
+    tracer.delete_tensors([])
+    assert tracer.cuda_usage == base_usage
+
+
+if __name__ == '__main__':
+    test_model_data_memtracer_batched()
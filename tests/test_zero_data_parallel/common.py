@@ -1,11 +1,18 @@
+import queue
+import time
+import traceback
 from functools import partial
 
+import colossalai
 import torch
 import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
 
+from colossalai.context.random import reset_seeds
+from colossalai.core import global_context as gpc
 from colossalai.logging import get_dist_logger
-from colossalai.utils import checkpoint
+from colossalai.utils import checkpoint, free_port
 from colossalai.zero.sharded_model import ShardedModelV2
 
 LOGGER = get_dist_logger()
@@ -22,6 +29,170 @@ CONFIG = dict(fp16=dict(mode=None,),
               parallel=dict(pipeline=dict(size=1), tensor=dict(size=1, mode=None)))
 
 
+def _dist_worker_loop(rank, world_size, port, config, backend, seed, job_queue, result_queue):
+    colossalai.launch(config=config,
+                      rank=rank,
+                      world_size=world_size,
+                      host='localhost',
+                      port=port,
+                      backend=backend,
+                      seed=seed)
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        func, args, kwargs = job
+        # re-seed for every job, so that a case does not depend on the cases run before it in this worker
+        reset_seeds()
+        gpc.set_seed(seed)
+        try:
+            func(*args, **kwargs)
+            result_queue.put((rank, None))
+        except Exception:
+            result_queue.put((rank, traceback.format_exc()))
+        torch.cuda.empty_cache()
+
+
+class _DistWorkers:
+    # the maximum time of a job in seconds
+    JOB_TIMEOUT = 600
+    # after a rank fails, the time in seconds to wait for the other ranks
+    # before they are considered to be stuck in a collective
+    ERROR_GRACE_PERIOD = 10
+
+    def __init__(self, world_size, config, port, backend, seed):
+        # the workers are forked from a clean server process, which is cheaper than spawning
+        # and still safe as cuda is only initialized in the workers
+        ctx = mp.get_context('forkserver')
+        self.world_size = world_size
+        self.job_queues = [ctx.Queue() for _ in range(world_size)]
+        self.result_queue = ctx.Queue()
+        self.processes = [
+            ctx.Process(target=_dist_worker_loop,
+                        args=(rank, world_size, port, config, backend, seed, self.job_queues[rank], self.result_queue),
+                        daemon=True) for rank in range(world_size)
+        ]
+        for p in self.processes:
+            p.start()
+
+    def run(self, func, *args, **kwargs):
+        for job_queue in self.job_queues:
+            job_queue.put((func, args, kwargs))
+        deadline = time.monotonic() + self.JOB_TIMEOUT
+        errors = []
+        num_results = 0
+        while num_results < self.world_size:
+            try:
+                rank, error = self.result_queue.get(timeout=1)
+            except queue.Empty:
+                if not all(p.is_alive() for p in self.processes):
+                    self.terminate()
+                    errors.append('a distributed test worker exited unexpectedly')
+                    break
+                if time.monotonic() > deadline:
+                    self.terminate()
+                    errors.append(f'{self.world_size - num_results} rank(s) did not finish in time and were terminated')
+                    break
+                continue
+            num_results += 1
+            if error is not None:
+                errors.append(f'rank {rank}:\n{error}')
+                deadline = min(deadline, time.monotonic() + self.ERROR_GRACE_PERIOD)
+        if errors:
+            raise RuntimeError('\n'.join(errors))
+
+    def terminate(self):
+        for p in self.processes:
+            p.terminate()
+        for p in self.processes:
+            p.join()
+
+    def shutdown(self):
+        for job_queue in self.job_queues:
+            job_queue.put(None)
+        for p in self.processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+
+
+class DistPool:
+    """
+    A pool of distributed workers which are launched once per world size and reused across test cases,
+    so that process spawning and the initialization of the process groups are not paid by each case.
+    The function to run must be picklable and is executed on all ranks, and should not launch colossalai itself.
+    The random states are re-seeded before every job.
+    Workers use nccl, except for a single rank which uses `single_rank_backend`, as gloo is much cheaper
+    to initialize for suites whose collectives are all supported by gloo.
+    """
+
+    def __init__(self, config=CONFIG, get_port=free_port, seed=1024, single_rank_backend='nccl'):
+        self.config = config
+        self.get_port = get_port
+        self.seed = seed
+        self.single_rank_backend = single_rank_backend
+        self._workers = dict()
+
+    def run(self, world_size, func, *args, **kwargs):
+        if world_size not in self._workers:
+            backend = self.single_rank_backend if world_size == 1 else 'nccl'
+            self._workers[world_size] = _DistWorkers(world_size, self.config, self.get_port(), backend, self.seed)
+        workers = self._workers[world_size]
+        try:
+            workers.run(func, *args, **kwargs)
+        except Exception:
+            # the workers may be stuck in a collective after a failure, so they are not reused
+            del self._workers[world_size]
+            workers.shutdown()
+            raise
+
+    def shutdown(self):
+        for workers in self._workers.values():
+            workers.shutdown()
+        self._workers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+class CUDAPrefetcher:
+    """
+    Iterates over a dataloader of (data, label) batches and copies the next batch to the GPU
+    on a side stream, so that the host to device copy overlaps with the computation of the current batch.
+    """
+
+    def __init__(self, dataloader):
+        self._iter = iter(dataloader)
+        self._stream = torch.cuda.Stream()
+        self._preload()
+
+    def _preload(self):
+        try:
+            data, label = next(self._iter)
+        except StopIteration:
+            self._next_batch = None
+            return
+        with torch.cuda.stream(self._stream):
+            self._next_batch = (data.cuda(non_blocking=True), label.cuda(non_blocking=True))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        torch.cuda.current_stream().wait_stream(self._stream)
+        batch = self._next_batch
+        if batch is None:
+            raise StopIteration
+        # the batch is allocated on the side stream but used on the current stream
+        for tensor in batch:
+            tensor.record_stream(torch.cuda.current_stream())
+        self._preload()
+        return batch
+
+
 def run_fwd_bwd(model, data, label, criterion, enable_autocast=False):
     model.train()
     with torch.cuda.amp.autocast(enabled=enable_autocast):
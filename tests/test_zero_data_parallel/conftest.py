@@ -0,0 +1,11 @@
+import pytest
+
+from common import DistPool
+
+
+# the workers hold their cuda contexts and communicators,
+# so they are released once a module is done for the suites which still spawn their own processes
+@pytest.fixture(scope='module')
+def dist_pool(port_pool):
+    with DistPool(get_port=port_pool.pop) as pool:
+        yield pool
@@ -1,43 +1,49 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 
-from copy import deepcopy
-from functools import partial
-
-import colossalai
 import pytest
 import torch
-import torch.multiprocessing as mp
-from colossalai.utils import free_port
 from colossalai.zero.shard_utils import (BucketTensorShardStrategy, TensorShardStrategy)
 from colossalai.zero.sharded_model import ShardedModelV2
 from tests.components_to_test.registry import non_distributed_component_funcs
+from tests.components_to_test.utils import clone_cuda_module
+
+from common import DistPool
+
 
-from common import CONFIG
+@pytest.fixture(scope='module')
+def dist_pool(port_pool):
+    # the state dict only all-gathers the shards, which gloo supports for cuda tensors,
+    # so a single rank does not bootstrap nccl communicators
+    with DistPool(get_port=port_pool.pop, single_rank_backend='gloo') as pool:
+        yield pool
 
 
-def run_dist(rank, world_size, port, shard_strategy):
-    colossalai.launch(config=CONFIG, rank=rank, world_size=world_size, host='localhost', port=port, backend='nccl')
-    test_models = ['repeated_computed_layers', 'resnet18']
+def run_dist(shard_strategy, model_name):
     shard_strategy = shard_strategy()
-    for model_name in test_models:
-        get_components_func = non_distributed_component_funcs.get_callable(model_name)
-        model_builder, train_dataloader, test_dataloader, optimizer, criterion = get_components_func()
-        model = model_builder()
-        model = model.half().cuda()
-        zero_model = ShardedModelV2(deepcopy(model), shard_strategy)
-        zero_state_dict = zero_model.state_dict()
-        for key, val in model.state_dict().items():
-            assert torch.equal(val, zero_state_dict[key])
+    model_builder, train_dataloader, test_dataloader, optimizer, criterion = \
+        non_distributed_component_funcs.get_components(model_name)
+    model = model_builder()
+    model = model.half().cuda()
+    zero_model = ShardedModelV2(clone_cuda_module(model_builder, model), shard_strategy)
+    state_dict = model.state_dict()
+    zero_state_dict = zero_model.state_dict()
+    assert state_dict.keys() == zero_state_dict.keys()
+    keys = list(state_dict.keys())
+    diffs = torch._foreach_sub([state_dict[key] for key in keys], [zero_state_dict[key] for key in keys])
+    # reduce on the device and only sync once for the whole state dict
+    max_diff = torch.stack([diff.abs().max().float() for diff in diffs]).max()
+    assert max_diff.item() == 0, f'max difference of the state dicts is {max_diff.item()}'
 
 
 @pytest.mark.dist
 @pytest.mark.parametrize("world_size", [1, 2])
 @pytest.mark.parametrize("shard_strategy", [TensorShardStrategy, BucketTensorShardStrategy])
-def test_zero_state_dict(world_size, shard_strategy):
-    run_func = partial(run_dist, world_size=world_size, port=free_port(), shard_strategy=shard_strategy)
-    mp.spawn(run_func, nprocs=world_size)
+@pytest.mark.parametrize("model_name", ['repeated_computed_layers', 'resnet18'])
+def test_zero_state_dict(dist_pool, world_size, shard_strategy, model_name):
+    dist_pool.run(world_size, run_dist, shard_strategy=shard_strategy, model_name=model_name)
 
 
 if __name__ == '__main__':
-    test_zero_state_dict(2, TensorShardStrategy)
+    with DistPool(single_rank_backend='gloo') as pool:
+        test_zero_state_dict(pool, 2, TensorShardStrategy, 'repeated_computed_layers')